@@ -17,6 +17,7 @@ from contextlib import contextmanager
 from . import parsers as hapi_parsers
 from . import caching as hapi_caching
 from . import multiprocessing as hapi_multiproc
+from . import compression as hapi_compression
 
 log = logging.getLogger(__name__)
 
@@ -87,6 +88,11 @@ def build_url(url: str, part: str) -> Optional[str]:
 _F = TypeVar('_F')
 
 
+def read_content(response: requests.Response, chunk_size: int = 1 << 16) -> bytes:
+    return hapi_compression.decode_stream(response.raw.stream(chunk_size, decode_content=False),
+                                          response.headers.get('Content-Encoding'))
+
+
 def get_from_endpoint(hapi_url: str, endpoint: str, parameters=None,
                       payload_extractor: Callable[[bytes], _F] = hapi_parsers.json_response) -> Optional[_F]:
     url = build_url(hapi_url, endpoint)
@@ -94,10 +100,12 @@ def get_from_endpoint(hapi_url: str, endpoint: str, parameters=None,
         parameters = {}
     if url:
         log.debug(f"New request url:  {url}?{'&'.join([key + '=' + value for key, value in parameters.items()])}")
-        response = requests.get(url, params=parameters)
-        if response.ok:
-            log.debug(f"success!")
-            return payload_extractor(response.content)
+        with requests.get(url, params=parameters, headers={'Accept-Encoding': hapi_compression.ACCEPT_ENCODING},
+                          stream=True) as response:
+            if response.ok:
+                log.debug(f"success!")
+                content = read_content(response)
+                return payload_extractor(content)
     else:
         raise ValueError(f"Given HAPI url seems invalid {hapi_url}")
     return None
@@ -178,16 +186,30 @@ def get_catalog(hapi_url: str) -> Optional[List[Dataset]]:
     return None
 
 
+class DataFormats:
+    CSV = 'csv'
+    JSON = 'json'
+
+
+def _selected_parameters(desc: DatasetInfo, parameters: Optional[List[str]] = None) -> List[Parameter]:
+    # HAPI servers always send time first, then requested parameters in dataset order
+    return [param for index, (name, param) in enumerate(desc.parameters.items())
+            if index == 0 or not parameters or name in parameters]
+
+
 @hapi_multiproc.SplitDataRequest
 @hapi_caching.DataRequestCache
 def get_data(hapi_url: str, dataset_id: str, start_time: Union[datetime, str],
-             stop_time: Union[datetime, str], parameters: Optional[List[str]] = None) -> Optional[pds.DataFrame]:
+             stop_time: Union[datetime, str], parameters: Optional[List[str]] = None,
+             format: str = DataFormats.CSV) -> Optional[pds.DataFrame]:
+    if format not in (DataFormats.CSV, DataFormats.JSON):
+        raise ValueError(f"Unsupported data format: {format}, expected one of {[DataFormats.CSV, DataFormats.JSON]}")
     desc = get_info(hapi_url=hapi_url, parameter_id=dataset_id)
     request_param = {
         'id': dataset_id,
         'time.min': isoformat(start_time),
         'time.max': isoformat(stop_time),
-        'format': 'csv'}
+        'format': format}
     if parameters is not None and len(parameters):
         if not set(parameters).issubset(desc.parameters.keys()):
             raise ValueError(f"""All parameters must belong to given dataset
@@ -195,9 +217,13 @@ Given parameters: {parameters}
 Dataset parameters: {desc.parameters.keys()}
 """)
         request_param['parameters'] = ','.join(parameters)
+    if format == DataFormats.JSON:
+        payload_extractor = partial(hapi_parsers.json_data, parameters=_selected_parameters(desc, parameters))
+    else:
+        payload_extractor = hapi_parsers.csv
     df = get_from_endpoint(hapi_url=hapi_url, endpoint=Endpoints.DATA,
                            parameters=request_param,
-                           payload_extractor=hapi_parsers.csv)
+                           payload_extractor=payload_extractor)
     return df
 
 
@@ -205,6 +231,23 @@ def clear_requests_caches():
     get_catalog.cache_clear()
     get_info.cache_clear()
     get_capabilities.cache_clear()
+    get_data.function.cache_clear()
+
+
+def enable_data_cache(max_entries: int = 128):
+    get_data.function.enable(max_entries)
+
+
+def disable_data_cache():
+    get_data.function.disable()
+
+
+def set_data_cache_compression(method: Optional[str] = None, level: Optional[int] = None):
+    get_data.function.set_compression(method, level)
+
+
+def transfer_stats() -> hapi_compression.TransferStats:
+    return hapi_compression.transfer_stats
 
 
 class Server:
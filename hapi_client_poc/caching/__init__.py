@@ -1,6 +1,9 @@
 from typing import Union, Optional, List
 from datetime import datetime
+from collections import OrderedDict
+import pickle
 import pandas as pds
+from .. import compression as hapi_compression
 
 
 class CachedRequest:
@@ -23,17 +26,79 @@ class CachedRequest:
 
 
 """
-has to be implemented, a simple, safe and efficient solution would be to use diskcache with the following impl:
+DataRequestCache only keeps whole requests in memory, a possible next step would be to use diskcache with:
 One entry per parameter per constant time slice (12h? or computed from sampling rate to use an optimum cache entry size)
 Cache entry keys would be f'{server_url}/{dataset_id}/{parameter_name}/{start_time.isoformat()}'
-This gives realy good performances on spwc.
+This gives realy good performances on spwc and would let overlapping requests share slices.
 """
 
 
+class CompressedStorage:
+    def __init__(self, method: Optional[str] = None, level: Optional[int] = None):
+        if method is not None and method not in hapi_compression.STORAGE_METHODS:
+            raise ValueError(f"Unsupported compression method: {method}, "
+                             f"expected one of {hapi_compression.STORAGE_METHODS} or None")
+        if method is not None and level is not None and (
+                type(level) is not int or level not in hapi_compression.STORAGE_LEVELS[method]):
+            levels = hapi_compression.STORAGE_LEVELS[method]
+            raise ValueError(f"Unsupported {method} compression level: {level}, "
+                             f"expected a value between {levels[0]} and {levels[-1]}")
+        self.method = method
+        self.level = level
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def pack(self, df: pds.DataFrame) -> bytes:
+        raw = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        blob = hapi_compression.compress(raw, self.method, self.level)
+        self.raw_bytes += len(raw)
+        self.stored_bytes += len(blob)
+        return blob
+
+    def unpack(self, blob: bytes) -> pds.DataFrame:
+        return pickle.loads(hapi_compression.decompress(blob, self.method))
+
+
 class DataRequestCache:
-    def __init__(self, function):
+    """Pass-through until enabled, then keeps at most max_entries results, least recently used are evicted first.
+
+    Whole requests are cached, a request whose time range reaches "now" keeps returning the first answer until it
+    gets evicted or the cache is cleared.
+    """
+
+    def __init__(self, function, storage: Optional[CompressedStorage] = None, max_entries: int = 0):
         self.function = function
+        self.storage = storage or CompressedStorage()
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
 
     def __call__(self, hapi_url: str, dataset_id: str, start_time: Union[datetime, str],
-                 stop_time: Union[datetime, str], parameters: Optional[List[str]] = None) -> Optional[pds.DataFrame]:
-        return self.function(hapi_url, dataset_id, start_time, stop_time, parameters)
+                 stop_time: Union[datetime, str], parameters: Optional[List[str]] = None,
+                 format: str = 'csv') -> Optional[pds.DataFrame]:
+        if self.max_entries <= 0:
+            return self.function(hapi_url, dataset_id, start_time, stop_time, parameters, format)
+        key = (hapi_url, dataset_id, str(start_time), str(stop_time), tuple(parameters or ()), format)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.storage.unpack(self.cache[key])
+        result = self.function(hapi_url, dataset_id, start_time, stop_time, parameters, format)
+        if result is not None:
+            self.cache[key] = self.storage.pack(result)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return result
+
+    def enable(self, max_entries: int = 128):
+        self.max_entries = max_entries
+
+    def disable(self):
+        self.max_entries = 0
+        self.cache_clear()
+
+    def set_compression(self, method: Optional[str] = None, level: Optional[int] = None):
+        storage = CompressedStorage(method, level)
+        self.cache_clear()
+        self.storage = storage
+
+    def cache_clear(self):
+        self.cache.clear()
@@ -0,0 +1,151 @@
+"""
+Transfer and storage compression helpers.
+
+HAPI CSV payloads compress very well, so requests negotiate gzip/deflate and decode the stream chunk by chunk,
+while cached data slices can be stored compressed with zlib or lzma from the standard library.
+"""
+from typing import Optional, Iterable
+import logging
+import zlib
+import lzma
+
+log = logging.getLogger(__name__)
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+STORAGE_LEVELS = {
+    'zlib': range(-1, 10),
+    'lzma': range(0, 10)
+}
+
+STORAGE_METHODS = tuple(STORAGE_LEVELS.keys())
+
+
+class TransferStats:
+    def __init__(self):
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+
+    def update(self, wire_bytes: int, decoded_bytes: int):
+        self.wire_bytes += wire_bytes
+        self.decoded_bytes += decoded_bytes
+
+    @property
+    def ratio(self) -> float:
+        if self.wire_bytes:
+            return self.decoded_bytes / self.wire_bytes
+        return 1.
+
+    def reset(self):
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+
+    def __repr__(self):
+        return f"TransferStats(wire_bytes={self.wire_bytes}, decoded_bytes={self.decoded_bytes}, ratio={self.ratio:.2f})"
+
+
+transfer_stats = TransferStats()
+
+
+def _has_zlib_header(data: bytes) -> bool:
+    return data[0] & 0x0F == 8 and ((data[0] << 8) | data[1]) % 31 == 0
+
+
+class _Decompressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            # created once the first two bytes tell if there is a zlib header,
+            # some servers send raw deflate streams without it
+            self._decompressor = None
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+        self._pending = b''
+        self._received = False
+
+    def decompress(self, chunk: bytes) -> bytes:
+        self._received = self._received or bool(chunk)
+        if self._decompressor is None:
+            self._pending += chunk
+            if len(self._pending) < 2:
+                return b''
+            wbits = zlib.MAX_WBITS if _has_zlib_header(self._pending) else -zlib.MAX_WBITS
+            self._decompressor = zlib.decompressobj(wbits)
+            chunk, self._pending = self._pending, b''
+        return self._decompressor.decompress(chunk)
+
+    def flush(self) -> bytes:
+        if self._decompressor is None:
+            if not self._received:
+                return b''
+            # a single byte can't hold a zlib header, it can only be raw deflate
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            tail = self._decompressor.decompress(self._pending)
+        else:
+            tail = b''
+        tail += self._decompressor.flush()
+        if self._received and not self._decompressor.eof:
+            raise ValueError(f"Truncated {self.encoding} stream")
+        return tail
+
+
+class StreamDecoder:
+    def __init__(self, content_encoding: Optional[str] = None):
+        self.encoding = (content_encoding or 'identity').strip().lower()
+        encodings = [encoding.strip() for encoding in self.encoding.split(',')]
+        # stacked encodings are listed in the order they were applied, so they have to be undone backward
+        try:
+            self._decompressors = [_Decompressor(encoding) for encoding in reversed(encodings)
+                                   if encoding not in ('identity', '')]
+        except ValueError as e:
+            # like requests did before, content with an unknown encoding is passed through untouched
+            log.warning(f"{e}, passing content through undecoded")
+            self._decompressors = []
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+
+    def feed(self, chunk: bytes) -> bytes:
+        self.wire_bytes += len(chunk)
+        for decompressor in self._decompressors:
+            chunk = decompressor.decompress(chunk)
+        self.decoded_bytes += len(chunk)
+        return chunk
+
+    def flush(self) -> bytes:
+        tail = b''
+        for decompressor in self._decompressors:
+            tail = decompressor.decompress(tail) + decompressor.flush()
+        self.decoded_bytes += len(tail)
+        return tail
+
+
+def decode_stream(chunks: Iterable[bytes], content_encoding: Optional[str] = None) -> bytes:
+    decoder = StreamDecoder(content_encoding)
+    decoded = [decoder.feed(chunk) for chunk in chunks]
+    decoded.append(decoder.flush())
+    transfer_stats.update(decoder.wire_bytes, decoder.decoded_bytes)
+    log.debug(f"Received {decoder.wire_bytes} bytes on the wire ({decoder.encoding}), "
+              f"{decoder.decoded_bytes} bytes decoded")
+    return b''.join(decoded)
+
+
+def compress(data: bytes, method: Optional[str] = 'zlib', level: Optional[int] = None) -> bytes:
+    if method is None:
+        return data
+    if method == 'zlib':
+        return zlib.compress(data, -1 if level is None else level)
+    if method == 'lzma':
+        return lzma.compress(data, preset=level)
+    raise ValueError(f"Unsupported compression method: {method}, expected one of {STORAGE_METHODS} or None")
+
+
+def decompress(data: bytes, method: Optional[str] = 'zlib') -> bytes:
+    if method is None:
+        return data
+    if method == 'zlib':
+        return zlib.decompress(data)
+    if method == 'lzma':
+        return lzma.decompress(data)
+    raise ValueError(f"Unsupported compression method: {method}, expected one of {STORAGE_METHODS} or None")
@@ -15,5 +15,6 @@ class SplitDataRequest:
         self.function = function
 
     def __call__(self, hapi_url: str, dataset_id: str, start_time: Union[datetime, str],
-                 stop_time: Union[datetime, str], parameters: Optional[List[str]] = None) -> Optional[pds.DataFrame]:
-        return self.function(hapi_url, dataset_id, start_time, stop_time, parameters)
+                 stop_time: Union[datetime, str], parameters: Optional[List[str]] = None,
+                 format: str = 'csv') -> Optional[pds.DataFrame]:
+        return self.function(hapi_url, dataset_id, start_time, stop_time, parameters, format)
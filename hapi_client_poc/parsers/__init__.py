@@ -1,8 +1,16 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import json
 from io import BytesIO
+import numpy as np
 import pandas as pds
 
+_hapi_dtypes = {
+    'double': np.float64,
+    'integer': np.int64,
+    'string': object,
+    'isotime': object
+}
+
 
 def is_ok(response: Dict):
     return response['status']["message"] == "OK" and response['status']['code'] == 1200
@@ -22,3 +30,48 @@ def csv(data: bytes) -> Optional[pds.DataFrame]:
         df = pds.read_csv(BytesIO(data), index_col=0, parse_dates=True, header=None)
         return df
     return None
+
+
+def _columns(values, parameter) -> List:
+    try:
+        block = np.array(values, dtype=_hapi_dtypes.get(parameter.type, object))
+    except TypeError:
+        # null integers can't be stored as int64, read_csv also falls back to float64 with NaN
+        block = np.array(values, dtype=np.float64)
+    block = block.reshape(len(block), -1)  # array parameters are flattened into consecutive columns like in CSV
+    return list(block.T)
+
+
+def _time_index(values) -> pds.Index:
+    try:
+        return pds.to_datetime(values, utc=True)
+    except ValueError:
+        pass
+    # HAPI also allows day of year timestamps such as 2016-001T00:00:00.000Z
+    doy = pds.Index(values).str.rstrip('Z')
+    for time_format in ('%Y-%jT%H:%M:%S.%f', '%Y-%jT%H:%M:%S'):
+        try:
+            return pds.to_datetime(doy, format=time_format, utc=True)
+        except ValueError:
+            pass
+    # like read_csv(parse_dates=True), unparsable time stamps are kept as strings
+    return pds.Index(values)
+
+
+def json_data(data: bytes, parameters: List) -> Optional[pds.DataFrame]:
+    payload = json_response(data) if len(data) else None
+    if payload is None or not len(payload.get('data', [])):
+        return None
+    rows = payload['data']
+    widths = set(map(len, rows))
+    if widths != {len(parameters)}:
+        raise ValueError(f"JSON data rows have {sorted(widths)} columns, expected {len(parameters)}: "
+                         f"{[parameter.name for parameter in parameters]}")
+    # transpose once then decode each parameter column in bulk instead of walking rows
+    columns = [column
+               for values, parameter in zip(zip(*rows), parameters)
+               for column in _columns(values, parameter)]
+    # like read_csv(parse_dates=True), only the time index is converted, other isotime columns stay strings
+    df = pds.DataFrame(dict(enumerate(columns[1:], start=1)), index=_time_index(columns[0]))
+    df.index.name = 0
+    return df
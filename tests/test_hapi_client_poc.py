@@ -8,10 +8,18 @@ from time import perf_counter
 from functools import partial
 from dateutil import parser
 from datetime import timedelta, datetime
+import gzip
+import zlib
+import json
+import pandas as pds
+from unittest.mock import MagicMock, patch
 
 from hapi_client_poc import get_catalog, get_info, get_capabilities, get_from_endpoint, build_url, Endpoints, \
-    clear_requests_caches, get_data, hapi_server
+    clear_requests_caches, get_data, hapi_server, Parameter, read_content, transfer_stats, DatasetInfo, \
+    _selected_parameters
 from hapi_client_poc import parsers as hapi_parers
+from hapi_client_poc import compression as hapi_compression
+from hapi_client_poc import caching as hapi_caching
 
 
 @ddt
@@ -124,9 +132,229 @@ class TestHAPIRequests(unittest.TestCase):
             values = server.get_data(dataset.id, t_mid, t_mid + timedelta(minutes=10))
             self.assertIsNotNone(values)
 
+    def test_a_valid_server_provides_same_data_in_json_and_csv(self):
+        with hapi_server(self.hapi_server_url) as server:
+            dataset = server.get_catalog()[0]
+            t_start = parser.parse(dataset.description.startDate, fuzzy=True)
+            from_csv = server.get_data(dataset.id, t_start, t_start + timedelta(minutes=10))
+            from_json = server.get_data(dataset.id, t_start, t_start + timedelta(minutes=10), format='json')
+            self.assertIsNotNone(from_json)
+            pds.testing.assert_frame_equal(from_csv, from_json, check_dtype=False, check_index_type=False)
+
+    def test_get_data_with_unsupported_format_raises(self):
+        with self.assertRaises(ValueError):
+            get_data(hapi_url=self.hapi_server_url, dataset_id='dataset1', start_time=datetime.now(),
+                     stop_time=datetime.now() + timedelta(minutes=10), format='binary')
+
     def test_get_data_for_unrelated_with_dataset_parameter_raises(self):
         with self.assertRaises(ValueError):
             dataset = get_catalog(self.hapi_server_url)[0]
             get_data(hapi_url=self.hapi_server_url, dataset_id=dataset.id, start_time=datetime.now(),
                      stop_time=datetime.now() + timedelta(minutes=10),
                      parameters=["this parameter doesn't exists", "neither this one"])
+
+
+@ddt
+class TestCompression(unittest.TestCase):
+    def setUp(self) -> None:
+        self.payload = b'2016-01-01T00:00:00.000Z,1.0,2.0,3.0\n' * 1000
+
+    def chunks(self, data: bytes, size=64):
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    def mocked_response(self, wire: bytes, encoding=None):
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.ok = True
+        response.headers = {'Content-Encoding': encoding} if encoding else {}
+        response.raw.stream.side_effect = lambda chunk_size, decode_content: iter(self.chunks(wire, chunk_size))
+        return response
+
+    def decode(self, wire: bytes, encoding=None, chunk_size=64) -> bytes:
+        hapi_compression.transfer_stats.reset()
+        return hapi_compression.decode_stream(self.chunks(wire, chunk_size), encoding)
+
+    @data(
+        ('gzip', gzip.compress, 64),
+        ('deflate', zlib.compress, 64),
+        ('deflate', zlib.compress, 1),
+        ('deflate', lambda d: zlib.compress(d)[2:-4], 64),  # raw deflate stream without zlib header
+        ('deflate', lambda d: zlib.compress(d)[2:-4], 1),
+        ('gzip, deflate', lambda d: zlib.compress(gzip.compress(d)), 64),
+        ('deflate, gzip', lambda d: gzip.compress(zlib.compress(d)[2:-4]), 64),
+        ('deflate, gzip', lambda d: gzip.compress(zlib.compress(d)[2:-4]), 1),
+        (None, lambda d: d, 64),
+        ('identity', lambda d: d, 64)
+    )
+    @unpack
+    def test_stream_decoder_restores_payload(self, encoding, encoder, chunk_size):
+        wire = encoder(self.payload)
+        self.assertEqual(self.decode(wire, encoding, chunk_size), self.payload)
+        self.assertEqual(hapi_compression.transfer_stats.wire_bytes, len(wire))
+        self.assertEqual(hapi_compression.transfer_stats.decoded_bytes, len(self.payload))
+
+    def test_compressed_transfer_reports_savings(self):
+        self.decode(gzip.compress(self.payload), 'gzip')
+        self.assertGreater(transfer_stats().ratio, 1.)
+
+    @data('br', 'UTF-8', 'gzip, br')
+    def test_unsupported_encoding_is_passed_through(self, encoding):
+        with self.assertLogs('hapi_client_poc.compression', level='WARNING'):
+            self.assertEqual(self.decode(self.payload, encoding), self.payload)
+
+    @data('gzip', 'deflate', 'gzip, deflate')
+    def test_truncated_stream_raises(self, encoding):
+        wire = {'gzip': gzip.compress, 'deflate': zlib.compress,
+                'gzip, deflate': lambda d: zlib.compress(gzip.compress(d))}[encoding](self.payload)
+        with self.assertRaises(ValueError):
+            self.decode(wire[:-20], encoding)
+
+    def test_empty_compressed_body_is_accepted(self):
+        self.assertEqual(self.decode(b'', 'gzip'), b'')
+
+    def test_read_content_decodes_raw_stream(self):
+        response = self.mocked_response(gzip.compress(self.payload), 'gzip')
+        self.assertEqual(read_content(response, chunk_size=64), self.payload)
+        response.raw.stream.assert_called_once_with(64, decode_content=False)
+
+    def test_get_from_endpoint_negotiates_compression(self):
+        hapi_compression.transfer_stats.reset()
+        wire = gzip.compress(self.payload)
+        with patch('hapi_client_poc.requests.get', return_value=self.mocked_response(wire, 'gzip')) as get:
+            content = get_from_endpoint('http://server.domain/hapi', Endpoints.DATA, payload_extractor=lambda d: d)
+        self.assertEqual(content, self.payload)
+        self.assertEqual(get.call_args.kwargs['headers']['Accept-Encoding'], hapi_compression.ACCEPT_ENCODING)
+        self.assertTrue(get.call_args.kwargs['stream'])
+        self.assertEqual(transfer_stats().wire_bytes, len(wire))
+        self.assertEqual(transfer_stats().decoded_bytes, len(self.payload))
+
+    @data(('zlib', 1), ('zlib', 9), ('lzma', 0), ('lzma', 9), (None, None))
+    @unpack
+    def test_storage_compression_roundtrip(self, method, level):
+        self.assertEqual(
+            hapi_compression.decompress(hapi_compression.compress(self.payload, method, level), method),
+            self.payload)
+
+    @data(('bz2', None), ('zlib', 42), ('zlib', -2), ('lzma', -1), ('lzma', 10), ('zlib', 5.0), ('lzma', True))
+    @unpack
+    def test_unsupported_storage_settings_raise(self, method, level):
+        with self.assertRaises(ValueError):
+            hapi_caching.CompressedStorage(method, level)
+
+    def test_data_cache_is_pass_through_by_default(self):
+        calls = []
+        cache = hapi_caching.DataRequestCache(lambda *args: calls.append(args) or pds.DataFrame())
+        cache('http://server', 'dataset', '2016-01-01', '2016-01-02')
+        cache('http://server', 'dataset', '2016-01-01', '2016-01-02')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(cache.cache), 0)
+        self.assertIsNone(cache.storage.method)
+
+    def test_data_cache_stores_compressed_slices(self):
+        df = pds.DataFrame({'value': [1.] * 1000})
+        calls = []
+
+        def fake_get_data(*args):
+            calls.append(args)
+            return df
+
+        cache = hapi_caching.DataRequestCache(fake_get_data)
+        cache.enable()
+        cache.set_compression('lzma', 6)
+        first = cache('http://server', 'dataset', '2016-01-01', '2016-01-02')
+        second = cache('http://server', 'dataset', '2016-01-01', '2016-01-02')
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(first.equals(second))
+        self.assertLess(cache.storage.stored_bytes, cache.storage.raw_bytes)
+
+    def test_data_cache_evicts_least_recently_used(self):
+        calls = []
+        cache = hapi_caching.DataRequestCache(lambda *args: calls.append(args) or pds.DataFrame(), max_entries=2)
+        for start in ('2016-01-01', '2016-01-02', '2016-01-01', '2016-01-03', '2016-01-01', '2016-01-02'):
+            cache('http://server', 'dataset', start, '2016-01-04')
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(len(cache.cache), 2)
+
+
+@ddt
+class TestJSONDataParser(unittest.TestCase):
+    def setUp(self) -> None:
+        self.parameters = [
+            Parameter(name='Time', type='isotime', units='UTC'),
+            Parameter(name='scalar', type='double', units='nT'),
+            Parameter(name='vector', type='double', units='nT', size=[3]),
+            Parameter(name='count', type='integer', units=None),
+            Parameter(name='label', type='string', units=None)
+        ]
+        self.payload = json.dumps({
+            'HAPI': '2.0',
+            'status': {'code': 1200, 'message': 'OK'},
+            'format': 'json',
+            'data': [
+                ['2016-01-01T00:00:00.000Z', 1.5, [1., 2., 3.], 1, 'a, "quoted" label'],
+                ['2016-01-01T00:00:01.000Z', 2.5, [4., 5., 6.], 2, 'another label']
+            ]
+        }).encode()
+
+    def test_json_data_is_decoded_into_typed_columns(self):
+        df = hapi_parers.json_data(self.payload, self.parameters)
+        self.assertEqual(df.shape, (2, 6))
+        self.assertEqual(list(df.columns), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(df.index[1].second, 1)
+        self.assertEqual(df[1].dtype, 'float64')
+        self.assertEqual(list(df[4]), [3., 6.])
+        self.assertEqual(df[5].dtype, 'int64')
+        self.assertEqual(df[6].iloc[0], 'a, "quoted" label')
+
+    def test_json_data_matches_csv_layout(self):
+        csv = b'2016-01-01T00:00:00.000Z,1.5,1.0,2.0,3.0,1,"a, ""quoted"" label"\n' \
+              b'2016-01-01T00:00:01.000Z,2.5,4.0,5.0,6.0,2,another label\n'
+        pds.testing.assert_frame_equal(hapi_parers.csv(csv), hapi_parers.json_data(self.payload, self.parameters),
+                                       check_dtype=False, check_index_type=False)
+
+    def test_only_time_index_is_converted_to_datetime(self):
+        payload = json.dumps({'HAPI': '2.0', 'status': {'code': 1200, 'message': 'OK'},
+                              'data': [['2016-01-01T00:00:00Z', '2016-01-02T00:00:00Z']]}).encode()
+        df = hapi_parers.json_data(payload, [Parameter(name='Time', type='isotime', units='UTC'),
+                                             Parameter(name='other_time', type='isotime', units='UTC')])
+        self.assertEqual(df[1].iloc[0], '2016-01-02T00:00:00Z')
+
+    @data(('2016-001T00:00:00Z', 1), ('2016-032T00:00:01.500Z', 32))
+    @unpack
+    def test_day_of_year_time_index_is_converted_to_datetime(self, time, day_of_year):
+        payload = json.dumps({'HAPI': '2.0', 'status': {'code': 1200, 'message': 'OK'},
+                              'data': [[time, 1.5]]}).encode()
+        df = hapi_parers.json_data(payload, self.parameters[:2])
+        self.assertEqual(df.index[0].dayofyear, day_of_year)
+        self.assertEqual(str(df.index.tz), 'UTC')
+
+    def test_unparsable_time_index_is_kept_as_strings(self):
+        payload = json.dumps({'HAPI': '2.0', 'status': {'code': 1200, 'message': 'OK'},
+                              'data': [['2016-001T00:00Z', 1.5]]}).encode()
+        df = hapi_parers.json_data(payload, self.parameters[:2])
+        self.assertEqual(df.index[0], '2016-001T00:00Z')
+
+    def test_null_integers_fall_back_to_nan(self):
+        payload = json.dumps({'HAPI': '2.0', 'status': {'code': 1200, 'message': 'OK'},
+                              'data': [['2016-01-01T00:00:00Z', 1], ['2016-01-01T00:00:01Z', None]]}).encode()
+        df = hapi_parers.json_data(payload, self.parameters[:1] + self.parameters[3:4])
+        self.assertEqual(df[1].dtype, 'float64')
+        self.assertTrue(df[1].isna().iloc[1])
+
+    def test_json_data_with_unexpected_row_width_raises(self):
+        with self.assertRaises(ValueError):
+            hapi_parers.json_data(self.payload, self.parameters[:3])
+
+    def test_selected_parameters_follow_dataset_order(self):
+        desc = DatasetInfo(startDate='2016-01-01', stopDate='2016-01-02',
+                           parameters=[{'name': param.name, 'type': param.type, 'units': param.units}
+                                       for param in self.parameters])
+        self.assertEqual([param.name for param in _selected_parameters(desc, ['label', 'scalar'])],
+                         ['Time', 'scalar', 'label'])
+        self.assertEqual([param.name for param in _selected_parameters(desc)],
+                         [param.name for param in self.parameters])
+
+    def test_empty_json_data_returns_none(self):
+        self.assertIsNone(hapi_parers.json_data(b'', self.parameters))
+        self.assertIsNone(hapi_parers.json_data(
+            b'{"HAPI": "2.0", "status": {"code": 1200, "message": "OK"}, "data": []}', self.parameters))